@@ -0,0 +1,511 @@
+"""Проверка доступности хостов без запуска внешней утилиты ping
+
+Используются непривилегированные ICMP-сокеты (SOCK_DGRAM + IPPROTO_ICMP),
+а если система их не разрешает (net.ipv4.ping_group_range, Windows) -
+проверка через TCP-подключение к стандартным портам.
+
+Здесь же асинхронная проверка открытых TCP-портов (scan_ports).
+"""
+import asyncio
+import errno
+import ipaddress
+import os
+import select
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+
+# Порты для проверки через TCP, если ICMP недоступен
+TCP_FALLBACK_PORTS = (80, 443)
+
+# Ошибки, при которых ICMP-сокет создать нельзя и нужно перейти на TCP
+_ICMP_UNAVAILABLE = (errno.EPERM, errno.EACCES, errno.EPROTONOSUPPORT, errno.ESOCKTNOSUPPORT, errno.EAFNOSUPPORT)
+
+
+class ProbeResult:
+    """Результат проверки хоста: отправлено/получено, RTT и потери"""
+
+    def __init__(self, host, address=None, method='icmp'):
+        self.host = host
+        self.address = address
+        self.method = method
+        self.replies = []  # (номер, RTT в мс или None при потере)
+        self.error = None
+        self.timed_out = False
+
+    @property
+    def sent(self):
+        return len(self.replies)
+
+    @property
+    def received(self):
+        return len(self.rtts)
+
+    @property
+    def rtts(self):
+        return [rtt for _, rtt in self.replies if rtt is not None]
+
+    @property
+    def loss(self):
+        """Процент потерянных пакетов"""
+        if not self.sent:
+            return 100.0
+        return 100.0 * (self.sent - self.received) / self.sent
+
+    @property
+    def rtt_min(self):
+        return min(self.rtts) if self.rtts else None
+
+    @property
+    def rtt_max(self):
+        return max(self.rtts) if self.rtts else None
+
+    @property
+    def rtt_avg(self):
+        rtts = self.rtts
+        return sum(rtts) / len(rtts) if rtts else None
+
+    @property
+    def is_online(self):
+        return self.received > 0
+
+    def to_dict(self):
+        return {
+            'host': self.host,
+            'address': self.address,
+            'method': self.method,
+            'sent': self.sent,
+            'received': self.received,
+            'loss': round(self.loss, 1),
+            'rtt_min': self.rtt_min,
+            'rtt_avg': self.rtt_avg,
+            'rtt_max': self.rtt_max,
+            'is_online': self.is_online,
+            'error': self.error,
+        }
+
+    def format(self):
+        """Текстовый отчет в духе вывода ping для истории и писем"""
+        method = 'ICMP echo' if self.method == 'icmp' else 'TCP connect'
+        lines = [f'PING {self.host} ({self.address or "?"}): {method}']
+        for seq, rtt in self.replies:
+            lines.append(format_reply(self, seq, rtt))
+        if self.error:
+            lines.append(f'Ошибка: {self.error}')
+        lines.append(f'--- {self.host}: статистика ---')
+        lines.append(f'Отправлено = {self.sent}, получено = {self.received}, потеряно = {self.loss:.0f}%')
+        if self.rtts:
+            lines.append(f'RTT мин/сред/макс = {self.rtt_min:.2f}/{self.rtt_avg:.2f}/{self.rtt_max:.2f} мс')
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return f'<ProbeResult {self.host} {self.method} {self.received}/{self.sent}>'
+
+
+def format_reply(result, seq, rtt):
+    """Строка отчета об одном пакете"""
+    if rtt is None:
+        return f'Превышен интервал ожидания для seq={seq}'
+    return f'Ответ от {result.address}: seq={seq} время={rtt:.2f} мс'
+
+
+def _checksum(data):
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _echo_packet(family, ident, seq):
+    request_type = ICMP_ECHO_REQUEST if family == socket.AF_INET else ICMPV6_ECHO_REQUEST
+    payload = struct.pack('!d', time.monotonic()) + b'projectx2'.ljust(48, b'\0')
+    header = struct.pack('!BBHHH', request_type, 0, 0, ident, seq)
+    # Для ICMPv6 контрольную сумму всегда считает ядро
+    if family == socket.AF_INET:
+        header = struct.pack('!BBHHH', request_type, 0, _checksum(header + payload), ident, seq)
+    return header + payload
+
+
+def _open_icmp_socket(family):
+    proto = socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
+    return socket.socket(family, socket.SOCK_DGRAM, proto)
+
+
+def _wait_echo_reply(sock, family, seq, timeout):
+    """Ожидание ответа с нужным номером, RTT в мс или None"""
+    reply_type = ICMP_ECHO_REPLY if family == socket.AF_INET else ICMPV6_ECHO_REPLY
+    started = time.monotonic()
+    deadline = started + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        ready, _, _ = select.select([sock], [], [], remaining)
+        if not ready:
+            return None
+        data = sock.recv(1024)
+        # На macOS DGRAM-сокет отдает пакет вместе с IP-заголовком
+        if family == socket.AF_INET and data and data[0] >> 4 == 4:
+            data = data[(data[0] & 0x0F) * 4:]
+        if len(data) < 8:
+            continue
+        icmp_type, _, _, _, reply_seq = struct.unpack('!BBHHH', data[:8])
+        if icmp_type == reply_type and reply_seq == seq:
+            return (time.monotonic() - started) * 1000
+
+
+def _tcp_connect_rtt(address, family, ports, timeout):
+    """RTT TCP-подключения в мс; отказ в соединении тоже означает, что хост жив"""
+    deadline = time.monotonic() + timeout
+    for port in ports:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(remaining)
+        started = time.monotonic()
+        try:
+            sock.connect((address, port))
+            return (time.monotonic() - started) * 1000
+        except ConnectionRefusedError:
+            return (time.monotonic() - started) * 1000
+        except OSError:
+            continue
+        finally:
+            sock.close()
+    return None
+
+
+def _lookup(host):
+    family, _, _, _, sockaddr = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)[0]
+    return sockaddr[0], family
+
+
+class Resolver:
+    """Кэш DNS для проверок: LRU с TTL, отдельный TTL для ошибок, ожидание ограничено timeout
+
+    Запрос к DNS выполняется в своем пуле потоков, вызывающий ждет не дольше
+    timeout секунд; одновременные запросы одного имени объединяются. Если
+    ответ пришел позже, он все равно попадает в кэш для следующих проверок.
+    """
+
+    def __init__(self, ttl=300, negative_ttl=30, maxsize=4096, timeout=3.0, workers=32):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._workers = workers
+        self._executor = None
+        self._cache = OrderedDict()  # имя -> (истекает, (адрес, семейство), аргументы gaierror при ошибке)
+        self._pending = {}  # имя -> Future запроса, который сейчас выполняется
+        self._lock = threading.Lock()
+
+    def configure(self, **settings):
+        for name in ('ttl', 'negative_ttl', 'maxsize', 'timeout'):
+            if name in settings:
+                setattr(self, name, settings[name])
+        if 'workers' in settings:
+            self._workers = settings['workers']
+
+    def resolve(self, host):
+        """Адрес и семейство; при ошибке или таймауте - socket.gaierror"""
+        # IP-адрес в кэше и запросе к DNS не нуждается
+        for family in (socket.AF_INET, socket.AF_INET6):
+            try:
+                socket.inet_pton(family, host)
+                return host, family
+            except (OSError, ValueError):
+                pass
+
+        key = host.lower()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                _, value, error_args = entry
+                if error_args is not None:
+                    raise socket.gaierror(*error_args)
+                return value
+
+            future = self._pending.get(key)
+            started = future is None
+            if started:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='dns')
+                future = self._executor.submit(_lookup, host)
+                self._pending[key] = future
+
+        # Вне блокировки: если запрос уже завершился, колбэк выполнится
+        # сразу в этом потоке, а _store сам берет self._lock
+        if started:
+            future.add_done_callback(lambda done: self._store(key, done))
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise socket.gaierror(socket.EAI_AGAIN, f'DNS не ответил за {self.timeout} с')
+        except UnicodeError as e:
+            raise socket.gaierror(socket.EAI_NONAME, str(e))
+
+    def _store(self, key, future):
+        error = future.exception()
+        if error is None:
+            entry = (time.monotonic() + self.ttl, future.result(), None)
+        else:
+            # Например, UnicodeError для некорректного IDN-имени
+            error_args = error.args if isinstance(error, socket.gaierror) else (socket.EAI_NONAME, str(error))
+            entry = (time.monotonic() + self.negative_ttl, None, error_args)
+        with self._lock:
+            self._pending.pop(key, None)
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, host=None):
+        with self._lock:
+            if host is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(host.lower(), None)
+
+
+# Общий кэш для всех проверок процесса
+resolver = Resolver()
+
+
+def resolve(host):
+    """Первый адрес хоста и его семейство (через общий кэш resolver)"""
+    return resolver.resolve(host)
+
+
+def iter_ping(result, count=4, interval=1.0, timeout=1.0, deadline=10.0, family=None):
+    """Последовательная отправка проб, после каждой выдает (номер, RTT или None)
+
+    Адрес и семейство уже должны быть записаны в result.address; метод
+    (ICMP или TCP) выбирается при первой пробе и сохраняется в result.method.
+    """
+    if family is None:
+        family = socket.AF_INET6 if ':' in result.address else socket.AF_INET
+    finish_at = time.monotonic() + deadline
+
+    sock = None
+    try:
+        try:
+            sock = _open_icmp_socket(family)
+            result.method = 'icmp'
+        except OSError as e:
+            if e.errno not in _ICMP_UNAVAILABLE:
+                raise
+            result.method = 'tcp'
+
+        ident = os.getpid() & 0xFFFF
+        for seq in range(1, count + 1):
+            remaining = finish_at - time.monotonic()
+            if remaining <= 0:
+                result.timed_out = True
+                return
+            sent_at = time.monotonic()
+            wait = min(timeout, remaining)
+            if sock is not None:
+                sock.sendto(_echo_packet(family, ident, seq), (result.address, 0))
+                rtt = _wait_echo_reply(sock, family, seq, wait)
+            else:
+                rtt = _tcp_connect_rtt(result.address, family, TCP_FALLBACK_PORTS, wait)
+            result.replies.append((seq, rtt))
+            yield seq, rtt
+
+            if seq < count:
+                pause = interval - (time.monotonic() - sent_at)
+                if pause > 0:
+                    if time.monotonic() + pause > finish_at:
+                        result.timed_out = True
+                        return
+                    time.sleep(pause)
+    finally:
+        if sock is not None:
+            sock.close()
+
+
+def ping(host, count=4, interval=1.0, timeout=1.0, deadline=10.0):
+    """Проверка хоста: count проб, не дольше deadline секунд, без подпроцессов"""
+    result = ProbeResult(host)
+    try:
+        result.address, family = resolve(host)
+    except (socket.gaierror, UnicodeError) as e:
+        result.error = f'Не удалось определить адрес: {e}'
+        return result
+
+    try:
+        for _ in iter_ping(result, count=count, interval=interval, timeout=timeout,
+                           deadline=deadline, family=family):
+            pass
+    except OSError as e:
+        result.error = str(e)
+    return result
+
+
+# ================== ПРОВЕРКА ПОРТОВ ==================
+
+class PortScanResult:
+    """Результат проверки портов: состояние каждого порта (open/closed/filtered)"""
+
+    def __init__(self, host, address=None):
+        self.host = host
+        self.address = address
+        self.states = {}  # порт -> 'open' | 'closed' | 'filtered'
+        self.error = None
+        self.duration = 0.0
+
+    @property
+    def open_ports(self):
+        return sorted(port for port, state in self.states.items() if state == 'open')
+
+    def count(self, state):
+        return sum(1 for value in self.states.values() if value == state)
+
+    def to_dict(self):
+        return {
+            'host': self.host,
+            'address': self.address,
+            'scanned': len(self.states),
+            'open_ports': self.open_ports,
+            'closed': self.count('closed'),
+            'filtered': self.count('filtered'),
+            'duration': round(self.duration, 2),
+            'error': self.error,
+        }
+
+    def format(self):
+        """Текстовый отчет для истории"""
+        lines = [f'Проверка портов {self.host} ({self.address or "?"})']
+        if self.error:
+            lines.append(f'Ошибка: {self.error}')
+        for port in self.open_ports:
+            lines.append(f'{port}/tcp открыт')
+        lines.append(f'--- {self.host}: статистика ---')
+        lines.append(f'Проверено портов = {len(self.states)}, открыто = {self.count("open")}, '
+                     f'закрыто = {self.count("closed")}, нет ответа = {self.count("filtered")}')
+        lines.append(f'Время проверки: {self.duration:.2f} с')
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return f'<PortScanResult {self.host} {len(self.open_ports)}/{len(self.states)} open>'
+
+
+def parse_ports(spec, limit=1024):
+    """Список портов из строки вида "22,80,443,8000-8100" (без повторов, по возрастанию)"""
+    ports = set()
+    for part in spec.replace(' ', '').split(','):
+        if not part:
+            continue
+        try:
+            if '-' in part:
+                first, last = (int(value) for value in part.split('-', 1))
+            else:
+                first = last = int(part)
+        except ValueError:
+            raise ValueError(f'Неверный порт или диапазон: {part}')
+        if not 1 <= first <= last <= 65535:
+            raise ValueError(f'Порты должны быть от 1 до 65535: {part}')
+        ports.update(range(first, last + 1))
+        if len(ports) > limit:
+            raise ValueError(f'Слишком много портов, не больше {limit} за одну проверку')
+    if not ports:
+        raise ValueError('Не указаны порты')
+    return sorted(ports)
+
+
+class HostRateLimiter:
+    """Ограничение частоты подключений к одному хосту, общее для всех проверок процесса"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = {}  # адрес -> время, когда можно следующее подключение
+
+    def reserve(self, address):
+        """Резервирует слот подключения; возвращает, сколько секунд подождать"""
+        if not self.interval:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(address, 0.0))
+            self._next_slot[address] = slot + self.interval
+            # Давно не использовавшиеся адреса не копятся
+            if len(self._next_slot) > 10000:
+                self._next_slot = {key: value for key, value in self._next_slot.items() if value > now}
+            return slot - now
+
+
+async def _check_port(address, port, timeout, semaphore, limiter):
+    async with semaphore:
+        delay = limiter.reserve(address)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(address, port), timeout)
+        except ConnectionRefusedError:
+            return port, 'closed'
+        except (asyncio.TimeoutError, OSError):
+            return port, 'filtered'
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return port, 'open'
+
+
+async def _scan(result, ports, concurrency, timeout, limiter):
+    semaphore = asyncio.Semaphore(concurrency)
+    checks = [_check_port(result.address, port, timeout, semaphore, limiter) for port in ports]
+    for port, state in await asyncio.gather(*checks):
+        result.states[port] = state
+
+
+def is_public_address(address):
+    """Адрес из интернета: не loopback, не частная сеть, не link-local и не 0.0.0.0"""
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    if getattr(ip, 'ipv4_mapped', None) is not None:
+        ip = ip.ipv4_mapped
+    return not (ip.is_private or ip.is_loopback or ip.is_link_local
+                or ip.is_unspecified or ip.is_multicast or ip.is_reserved)
+
+
+def scan_ports(host, ports, concurrency=200, timeout=1.0, limiter=None, public_only=False):
+    """Проверка TCP-портов хоста подключением (connect scan)
+
+    Одновременно открывается не больше concurrency подключений, каждое
+    ждет ответа не дольше timeout секунд; limiter (HostRateLimiter)
+    ограничивает частоту подключений к хосту. С public_only адреса
+    внутренних сетей (см. is_public_address) не проверяются.
+    """
+    result = PortScanResult(host)
+    try:
+        address, _ = resolve(host)
+    except (socket.gaierror, UnicodeError) as e:
+        result.error = f'Не удалось определить адрес: {e}'
+        return result
+    if public_only and not is_public_address(address):
+        result.error = f'Адрес {address} относится к внутренней сети, его проверка запрещена'
+        return result
+    result.address = address
+
+    started = time.monotonic()
+    try:
+        asyncio.run(_scan(result, ports, concurrency, timeout, limiter or HostRateLimiter(0)))
+    except OSError as e:
+        result.error = str(e)
+    result.duration = time.monotonic() - started
+    return result
@@ -0,0 +1,33 @@
+"""Фоновый процесс ProjectX2: планировщик задач и доставка писем
+
+Запускается отдельно от веб-сервера, например:
+    python worker.py
+
+Веб-процессы (gunicorn и т.п.) фоновые задачи не запускают. Даже если
+воркеров несколько, каждая задача выполняется один раз за период:
+перед запуском она захватывает аренду в таблице job_lease.
+"""
+import signal
+import threading
+
+from app import app, db, run_migrations, start_background_jobs
+
+
+def main():
+    with app.app_context():
+        db.create_all()
+        run_migrations()
+    
+    start_background_jobs()
+    print('⏱️ Планировщик задач и доставка писем запущены')
+    
+    stopping = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stopping.set())
+    while not stopping.is_set():
+        stopping.wait(1)
+    print('⏹️ Фоновый процесс остановлен')
+
+
+if __name__ == '__main__':
+    main()